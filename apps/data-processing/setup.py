@@ -0,0 +1,14 @@
+"""
+Build script for the optional compiled extensions.
+
+    python setup.py build_ext --inplace
+"""
+
+from Cython.Build import cythonize
+from setuptools import Extension, setup
+
+extensions = [
+    Extension("src.ingestion._amount", ["src/ingestion/_amount.pyx"]),
+]
+
+setup(ext_modules=cythonize(extensions, language_level=3))
@@ -0,0 +1,31 @@
+# cython: language_level=3
+"""
+Compiled fast path for StellarDataFetcher._extract_asset_amount.
+
+Build with `python setup.py build_ext --inplace`; the fetcher falls back to
+the pure-Python implementation when this extension isn't built.
+"""
+
+
+cpdef double extract(dict record, str asset_code) except? -1.0:
+    """
+    Get the amount of an asset moved by a payment or trade record.
+
+    Args:
+        record: Payment record (for XLM) or trade record
+        asset_code: Asset code to extract
+
+    Returns:
+        Amount of the asset, or 0.0 if the record doesn't involve it
+    """
+    if asset_code == "XLM":
+        if record.get("asset_type") != "native":
+            return 0.0
+        return float(record.get("amount", "0"))
+
+    # Check if this is buying or selling our target asset
+    if record.get("base_asset_code") == asset_code:
+        return float(record.get("base_amount", "0"))
+    if record.get("counter_asset_code") == asset_code:
+        return float(record.get("counter_amount", "0"))
+    return 0.0
@@ -3,20 +3,109 @@ Stellar Blockchain Data Fetcher
 Fetches historical transaction and volume data from Stellar Horizon API.
 """
 
+import contextlib
+import functools
+import hashlib
+import math
+import random
+import threading
 import time
-from typing import Dict, List, Optional, Tuple, Any
+import uuid
+from email.utils import parsedate_to_datetime
+from concurrent.futures import ThreadPoolExecutor
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Generator,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+)
 from datetime import datetime, timedelta
 from dataclasses import dataclass
-import json
-from stellar_sdk import Server, Asset
-from stellar_sdk.exceptions import NotFoundError, BadRequestError, ConnectionError
+import numpy as np
+import orjson
+import redis
+from cachetools import TLRUCache
+from stellar_sdk import Server
+from stellar_sdk.__version__ import __version__ as STELLAR_SDK_VERSION
+from stellar_sdk.client.base_sync_client import BaseSyncClient
+from stellar_sdk.client.requests_client import RequestsClient
+from stellar_sdk.client.response import Response
+from stellar_sdk.exceptions import (
+    NotFoundError,
+    BadRequestError,
+    ConnectionError,
+    ContentSizeLimitExceededError,
+)
 from stellar_sdk.call_builder.call_builder_async import PaymentsCallBuilder
 
+# Fast C ISO-8601 parser for Horizon timestamps
+try:
+    import ciso8601
+
+    CISO8601_AVAILABLE = True
+except ImportError:
+    CISO8601_AVAILABLE = False
+
+# Compiled fast path for _extract_asset_amount (built from _amount.pyx)
+try:
+    from ._amount import extract as _extract_asset_amount_compiled
+
+    AMOUNT_EXTENSION_AVAILABLE = True
+except ImportError:
+    AMOUNT_EXTENSION_AVAILABLE = False
+
+# HTTP/2 transport for Horizon calls
+try:
+    import h2  # noqa: F401  (required by httpx for HTTP/2)
+    import httpx
+
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+# Compression of large Redis payloads
+try:
+    import zstandard
+
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+
+def _parse_datetime(value: str) -> datetime:
+    """
+    Parse an ISO-8601 timestamp such as Horizon's "2023-01-01T12:00:00Z".
+
+    Uses ciso8601 when installed and falls back to datetime.fromisoformat,
+    which doesn't accept a trailing "Z" before Python 3.11.
+    """
+    if CISO8601_AVAILABLE:
+        return ciso8601.parse_datetime(value)
+    return datetime.fromisoformat(value.replace("Z", "+00:00"))
+
 
 @dataclass
 class VolumeData:
     """Volume data for a specific asset over a time period"""
 
+    # Declared by hand since dataclass(slots=True) needs Python 3.10
+    __slots__ = (
+        "asset_code",
+        "asset_issuer",
+        "time_period_hours",
+        "total_volume",
+        "transaction_count",
+        "start_time",
+        "end_time",
+        "volume_by_hour",
+    )
+
     asset_code: str
     asset_issuer: Optional[str]
     time_period_hours: int
@@ -44,11 +133,37 @@ class VolumeData:
             ),
         }
 
+    @classmethod
+    def from_dict(cls, data: Dict) -> "VolumeData":
+        """Rebuild from the output of to_dict"""
+        return cls(
+            asset_code=data["asset_code"],
+            asset_issuer=data["asset_issuer"],
+            time_period_hours=data["time_period_hours"],
+            total_volume=data["total_volume"],
+            transaction_count=data["transaction_count"],
+            start_time=_parse_datetime(data["start_time"]),
+            end_time=_parse_datetime(data["end_time"]),
+            volume_by_hour=data["volume_by_hour"],
+        )
+
 
 @dataclass
 class TransactionRecord:
     """Individual transaction record"""
 
+    __slots__ = (
+        "id",
+        "hash",
+        "created_at",
+        "source_account",
+        "operation_count",
+        "total_amount",
+        "fee_charged",
+        "memo",
+        "successful",
+    )
+
     id: str
     hash: str
     created_at: datetime
@@ -74,6 +189,352 @@ class TransactionRecord:
         }
 
 
+class OrjsonResponse(Response):
+    """stellar_sdk Response that parses its body with orjson."""
+
+    def __init__(
+        self, status_code: int, content: bytes, text: str, headers: dict, url: str
+    ) -> None:
+        super().__init__(status_code=status_code, text=text, headers=headers, url=url)
+        self.content = content
+
+    def json(self) -> dict:
+        """Parse the response body, straight from its raw bytes."""
+        return orjson.loads(self.content)
+
+
+class HttpxClient(BaseSyncClient):
+    """
+    stellar_sdk client sending Horizon requests over HTTP/2 with httpx.
+
+    Requests to the same Horizon host are multiplexed over one TLS
+    connection instead of needing a connection each. Event streams still go
+    through a RequestsClient, since httpx has no server-sent events support.
+
+    Like RequestsClient, requests carry the SDK identification headers and
+    are retried on connection errors and 413/429/503/504 responses with
+    exponential backoff, waiting for Retry-After when the server sends it.
+    """
+
+    MAX_KEEPALIVE_CONNECTIONS = 64
+    NUM_RETRIES = 3
+    BACKOFF_FACTOR = 0.5  # seconds, doubled on each retry after the first
+    RETRY_STATUSES = frozenset({413, 429, 503, 504})
+    HEADERS = {
+        "X-Client-Name": "py-stellar-base",
+        "X-Client-Version": STELLAR_SDK_VERSION,
+        "User-Agent": f"py-stellar-base/{STELLAR_SDK_VERSION}/HttpxClient",
+    }
+
+    def __init__(self, request_timeout: float = 30):
+        self._client = httpx.Client(
+            http2=True,
+            timeout=request_timeout,
+            headers=self.HEADERS,
+            limits=httpx.Limits(
+                max_keepalive_connections=self.MAX_KEEPALIVE_CONNECTIONS
+            ),
+        )
+        self._stream_client = RequestsClient(request_timeout=request_timeout)
+
+    @staticmethod
+    def _to_response(resp: "httpx.Response") -> Response:
+        return OrjsonResponse(
+            status_code=resp.status_code,
+            content=resp.content,
+            text=resp.text,
+            headers=dict(resp.headers),
+            url=str(resp.url),
+        )
+
+    def _retry_delay(self, attempt: int, resp: Optional["httpx.Response"]) -> float:
+        """Seconds to wait before retry number `attempt` (0-based)."""
+        retry_after = resp.headers.get("Retry-After") if resp is not None else None
+        if retry_after:
+            try:
+                return max(0.0, float(retry_after))
+            except ValueError:
+                try:
+                    retry_at = parsedate_to_datetime(retry_after)
+                    return max(0.0, retry_at.timestamp() - time.time())
+                except (TypeError, ValueError):
+                    pass
+        # Same schedule as urllib3: no wait before the first retry
+        return 0.0 if attempt == 0 else self.BACKOFF_FACTOR * 2**attempt
+
+    def _request(self, method: str, url: str, **kwargs: Any) -> "httpx.Response":
+        """Send a request, retrying transient failures."""
+        attempt = 0
+        while True:
+            try:
+                resp = self._client.request(method, url, **kwargs)
+            except httpx.HTTPError as err:
+                if attempt == self.NUM_RETRIES:
+                    raise ConnectionError(err) from err
+                resp = None
+            else:
+                if (
+                    resp.status_code not in self.RETRY_STATUSES
+                    or attempt == self.NUM_RETRIES
+                ):
+                    return resp
+
+            time.sleep(self._retry_delay(attempt, resp))
+            attempt += 1
+
+    def get(
+        self,
+        url: str,
+        params: Optional[Dict[str, str]] = None,
+        max_content_size: Optional[int] = None,
+    ) -> Response:
+        """Perform HTTP GET request."""
+        resp = self._request("GET", url, params=params)
+
+        if max_content_size is not None and len(resp.content) > max_content_size:
+            raise ContentSizeLimitExceededError(
+                limit=max_content_size, content_size=len(resp.content)
+            )
+        return self._to_response(resp)
+
+    def post(
+        self,
+        url: str,
+        data: Optional[Dict[str, str]] = None,
+        json_data: Optional[Dict[str, Any]] = None,
+    ) -> Response:
+        """Perform HTTP POST request."""
+        resp = self._request("POST", url, data=data, json=json_data)
+        return self._to_response(resp)
+
+    def stream(
+        self, url: str, params: Optional[Dict[str, str]] = None
+    ) -> Generator[Dict[str, Any], None, None]:
+        """Listen to a Horizon event stream."""
+        return self._stream_client.stream(url, params)
+
+    def close(self) -> None:
+        """Close the underlying connections."""
+        self._client.close()
+        self._stream_client.close()
+
+
+@functools.lru_cache(maxsize=None)
+def _get_server(horizon_url: str, timeout: float) -> Server:
+    """
+    Get the Horizon client for a URL and timeout, creating it on first use.
+
+    Sharing one Server (and its HTTP session) across fetchers keeps
+    connections pooled instead of doing a new TCP+TLS handshake per fetcher.
+    Requests go over HTTP/2 when httpx and h2 are installed.
+    """
+    if HTTP2_AVAILABLE:
+        client: BaseSyncClient = HttpxClient(request_timeout=timeout)
+    else:
+        client = RequestsClient(request_timeout=timeout)
+    return Server(horizon_url=horizon_url, client=client)
+
+
+class BloomFilter:
+    """
+    Fixed-size Bloom filter over strings.
+
+    Membership tests never give false negatives; false positives stay near
+    `error_rate` while no more than `capacity` items are added and grow
+    quickly beyond that, so callers should check `saturated`.
+    """
+
+    def __init__(self, capacity: int = 1024, error_rate: float = 0.01):
+        self.capacity = capacity
+        self.count = 0  # distinct items added, up to false positives
+        self.num_bits = max(
+            8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2))
+        )
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self._bits = bytearray((self.num_bits + 7) // 8)
+
+    def _positions(self, item: str) -> Iterator[int]:
+        # Double hashing: derive all k positions from one 128-bit digest
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        step = int.from_bytes(digest[8:], "little") | 1
+        return ((first + i * step) % self.num_bits for i in range(self.num_hashes))
+
+    def add(self, item: str) -> None:
+        """Add an item to the filter."""
+        new = False
+        for pos in self._positions(item):
+            mask = 1 << (pos & 7)
+            if not self._bits[pos >> 3] & mask:
+                self._bits[pos >> 3] |= mask
+                new = True
+        if new:
+            self.count += 1
+
+    @property
+    def saturated(self) -> bool:
+        """Whether more than `capacity` items were added."""
+        return self.count > self.capacity
+
+    def __contains__(self, item: str) -> bool:
+        return all(
+            self._bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item)
+        )
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket rate limiter.
+
+    Tokens refill continuously at `rate` per second up to `capacity`.
+    Callers that find the bucket empty reserve a future token and wait
+    for it, so concurrent callers are spaced out rather than released
+    all at once. A rate lowered for a limited time goes back to the
+    configured `base_rate` once that time has passed.
+    """
+
+    def __init__(self, rate: float, capacity: float, min_rate: float = 0.0):
+        self.rate = rate
+        self.base_rate = rate
+        self.capacity = capacity
+        self.min_rate = min_rate
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._restore_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """
+        Take a token.
+
+        Returns:
+            Seconds the caller must wait before using it (0 if available now)
+        """
+        with self._lock:
+            now = time.monotonic()
+            if self._restore_at is not None and now >= self._restore_at:
+                self.rate = self.base_rate
+                self._restore_at = None
+            self._tokens = min(
+                self.capacity, self._tokens + (now - self._updated) * self.rate
+            )
+            self._updated = now
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+    def acquire(self) -> None:
+        """Block until a token is available."""
+        delay = self.reserve()
+        if delay > 0:
+            time.sleep(delay)
+
+    def set_rate(self, rate: float, duration: Optional[float] = None) -> None:
+        """
+        Change the refill rate, never going below min_rate.
+
+        Args:
+            rate: New requests per second
+            duration: Seconds after which base_rate is restored (optional)
+        """
+        with self._lock:
+            self.rate = max(rate, self.min_rate)
+            self._restore_at = (
+                time.monotonic() + duration if duration is not None else None
+            )
+
+
+@functools.lru_cache(maxsize=None)
+def _get_rate_limiter(
+    horizon_url: str, rate: float, capacity: float, min_rate: float
+) -> TokenBucket:
+    """
+    Get the token bucket throttling requests to a Horizon URL.
+
+    Horizon rate-limits per IP, so every fetcher in the process talking to
+    the same URL with the same limits draws from one bucket (including
+    backoff after 429s) instead of each starting with a full burst.
+    """
+    return TokenBucket(rate=rate, capacity=capacity, min_rate=min_rate)
+
+
+class ShardedCache:
+    """
+    Thread-safe TLRU cache split into independently locked shards.
+
+    Keys are spread over the shards by hash, so threads reading different
+    keys rarely contend for the same lock. Each shard holds an equal part
+    of `maxsize` and evicts on its own, so a shard can evict while others
+    still have room: with unevenly hashed keys the usable capacity is a
+    little below `maxsize` (roughly 970-980 of 1024 entries with 16 shards).
+    """
+
+    def __init__(
+        self,
+        maxsize: int,
+        ttu: Callable[[Any, Any, float], float],
+        shards: int = 16,
+    ):
+        if shards & (shards - 1):
+            raise ValueError("shards must be a power of two")
+        self.maxsize = maxsize
+        self._mask = shards - 1
+        self._shards = [
+            (TLRUCache(maxsize=max(1, maxsize // shards), ttu=ttu), threading.Lock())
+            for _ in range(shards)
+        ]
+
+    def _shard(self, key: Any) -> Tuple[TLRUCache, threading.Lock]:
+        return self._shards[hash(key) & self._mask]
+
+    def get(self, key: Any, default: Any = None) -> Any:
+        cache, lock = self._shard(key)
+        with lock:
+            return cache.get(key, default)
+
+    def pop(self, key: Any, default: Any = None) -> Any:
+        cache, lock = self._shard(key)
+        with lock:
+            return cache.pop(key, default)
+
+    def __getitem__(self, key: Any) -> Any:
+        cache, lock = self._shard(key)
+        with lock:
+            return cache[key]
+
+    def __setitem__(self, key: Any, value: Any) -> None:
+        cache, lock = self._shard(key)
+        with lock:
+            cache[key] = value
+
+    def __contains__(self, key: Any) -> bool:
+        cache, lock = self._shard(key)
+        with lock:
+            return key in cache
+
+    def keys(self) -> List[Any]:
+        """Snapshot the keys of all live entries."""
+        keys = []
+        for cache, lock in self._shards:
+            with lock:
+                keys.extend(cache.keys())
+        return keys
+
+    def __len__(self) -> int:
+        total = 0
+        for cache, lock in self._shards:
+            with lock:
+                total += len(cache)
+        return total
+
+    def clear(self) -> None:
+        """Remove all entries, one shard at a time."""
+        for cache, lock in self._shards:
+            with lock:
+                cache.clear()
+
+
 class StellarDataFetcher:
     """
     Fetches on-chain data from Stellar blockchain via Horizon API.
@@ -95,12 +556,64 @@ class StellarDataFetcher:
     MAX_RETRIES = 3
     RETRY_DELAY = 1  # seconds
     REQUEST_TIMEOUT = 30  # seconds
+    RATE_LIMIT_PER_SECOND = 10.0  # sustained Horizon requests per second
+    RATE_LIMIT_BURST = 20  # requests allowed in a burst
+    MIN_RATE_LIMIT_PER_SECOND = 0.5  # floor when backing off after 429s
+    RATE_LIMIT_WINDOW = 60  # seconds to back off when a 429 gives no window
+
+    # Caching
+    CACHE_MAXSIZE = 1024
+    CACHE_SHARDS = 16  # independently locked parts of the cache
+    CACHE_TTL_BY_TYPE = {"volume": 60, "network_stats": 5}  # seconds
+    REFRESH_AHEAD_TYPES = ("network_stats",)  # reloaded in the background
+    REFRESH_AHEAD_FRACTION = 0.8  # of the TTL elapsed before reloading
+    REFRESH_AHEAD_JITTER = 0.1  # +/- fraction, spreads reloads across replicas
+    SIGNATURE_TYPES = ("volume",)  # cache types invalidated by account activity
+    SIGNATURE_CAPACITY = 1024  # accounts per signature; broader entries use TTL
+    SIGNATURE_ERROR_RATE = 0.01
+
+    # Record fields holding the accounts an operation, payment or trade touches
+    ACCOUNT_FIELDS = (
+        "source_account",
+        "from",
+        "to",
+        "funder",
+        "account",
+        "base_account",
+        "counter_account",
+    )
+
+    L2_LOCK_TIMEOUT_MS = 5000  # lock lifetime, renewed while the load runs
+    L2_LOCK_POLL_INTERVAL = 0.05  # seconds between checks while another loads
+    L2_COMPRESS_MIN_BYTES = 256  # smaller payloads are stored as plain JSON
+    L2_COMPRESSION_LEVEL = 3
+    # Marks zstd-compressed Redis values; plain JSON never starts with it
+    _L2_ZSTD_PREFIX = b"\x01"
+
+    # Delete the lock only if it still holds our token
+    _RELEASE_LOCK_SCRIPT = """
+    if redis.call("get", KEYS[1]) == ARGV[1] then
+        return redis.call("del", KEYS[1])
+    end
+    return 0
+    """
+
+    # Extend the lock only if it still holds our token
+    _RENEW_LOCK_SCRIPT = """
+    if redis.call("get", KEYS[1]) == ARGV[1] then
+        return redis.call("pexpire", KEYS[1], ARGV[2])
+    end
+    return 0
+    """
 
     def __init__(
         self,
         horizon_url: Optional[str] = None,
         network: str = "public",
         timeout: Optional[float] = None,
+        redis_url: Optional[str] = None,
+        requests_per_second: Optional[float] = None,
+        burst: Optional[int] = None,
     ):
         """
         Initialize Stellar data fetcher.
@@ -108,6 +621,10 @@ class StellarDataFetcher:
         Args:
             horizon_url: Custom Horizon server URL (optional)
             network: 'public' for mainnet, 'testnet' for testnet
+            timeout: Request timeout in seconds (optional)
+            redis_url: Redis URL for a cache shared across workers (optional)
+            requests_per_second: Sustained Horizon request rate (optional)
+            burst: Number of requests allowed in a burst (optional)
         """
         if horizon_url:
             self.horizon_url = horizon_url
@@ -119,52 +636,101 @@ class StellarDataFetcher:
 
         print(f"Connecting to Horizon server: {self.horizon_url}")
 
-        # Initialize Stellar SDK server
+        # Stellar SDK server, shared by all fetchers for the same Horizon URL
         self.timeout = timeout if timeout is not None else self.REQUEST_TIMEOUT
-        self.server = Server(horizon_url=self.horizon_url, timeout=self.timeout)
-
-        # Cache for recent requests
-        self.cache = {}
-        self.cache_ttl = 300  # 5 minutes
-
-    def _handle_pagination(self, callable_func, *args, **kwargs) -> List[Dict]:
+        self.server = _get_server(self.horizon_url, self.timeout)
+
+        # Throttle Horizon requests to stay under its per-IP rate limit,
+        # shared by all fetchers for the same Horizon URL
+        self._bucket = _get_rate_limiter(
+            self.horizon_url,
+            requests_per_second or self.RATE_LIMIT_PER_SECOND,
+            burst or self.RATE_LIMIT_BURST,
+            self.MIN_RATE_LIMIT_PER_SECOND,
+        )
+
+        # Bounded cache for recent requests, keyed by (type, *args) with a
+        # per-type TTL, sharded so concurrent reads don't share one lock
+        self.cache_ttl = 300  # default TTL for types without an explicit one
+        self._ttl_by_type = dict(self.CACHE_TTL_BY_TYPE)
+        self.cache = ShardedCache(
+            maxsize=self.CACHE_MAXSIZE,
+            ttu=self._cache_ttu,
+            shards=self.CACHE_SHARDS,
+        )
+        # Guards the per-entry metadata below (signatures, refresh deadlines)
+        self._cache_lock = threading.Lock()
+
+        # Bloom filter of the accounts each cached volume was built from, so
+        # ledger closes only invalidate the entries they can affect
+        # (None for entries built from too many accounts to track)
+        self._cache_signatures: Dict[Tuple, Optional[BloomFilter]] = {}
+        self._watcher: Optional[threading.Thread] = None
+        self._watcher_stop = threading.Event()
+
+        # Per-key locks so concurrent misses trigger a single Horizon fetch
+        # Each entry is [lock, number of callers holding or waiting for it] and
+        # is dropped when the count reaches zero, so the dict stays small
+        self._inflight: Dict[Tuple, List[Any]] = {}
+        self._inflight_guard = threading.Lock()
+
+        # Refresh-ahead: monotonic time after which a cache read reloads the
+        # entry in the background, for types in REFRESH_AHEAD_TYPES
+        self._refresh_at: Dict[Tuple, float] = {}
+        self._executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="stellar-refresh"
+        )
+
+        # Optional second-level cache shared across processes
+        self._l2 = redis.Redis.from_url(redis_url) if redis_url else None
+
+        # Per-thread zstd (de)compressors, which aren't safe to share
+        self._zstd = threading.local()
+
+    def _cache_ttu(self, key: Tuple, value: Any, now: float) -> float:
+        """Return the expiry time of a cache entry based on its type."""
+        return now + self._ttl_by_type.get(key[0], self.cache_ttl)
+
+    def _handle_pagination(self, callable_func, *args, **kwargs) -> Iterator[Dict]:
         """
         Handle pagination for Horizon API responses.
 
+        Records are yielded as each page arrives, so memory stays constant
+        and callers can stop early without fetching the remaining pages.
+
         Args:
             callable_func: Function that returns a pageable response
             *args, **kwargs: Arguments for the function
 
-        Returns:
-            List of all records across all pages
+        Yields:
+            Records across all pages
         """
-        records = []
         cursor = None
         page_count = 0
         max_pages = 100  # Safety limit
 
         try:
             while page_count < max_pages:
-                # Build query parameters
-                query_params = kwargs.copy()
-                if cursor:
-                    query_params["cursor"] = cursor
-
                 # Make the request
                 if "call" in dir(callable_func):
                     # If it's a call builder object
-                    response = callable_func.call()
+                    if cursor:
+                        callable_func = callable_func.cursor(cursor)
+                    response = self._retry_request(callable_func.call)
                 else:
                     # If it's a regular function
-                    response = callable_func(*args, **query_params)
+                    query_params = kwargs.copy()
+                    if cursor:
+                        query_params["cursor"] = cursor
+                    response = self._retry_request(callable_func, *args, **query_params)
 
                 # Get records from this page
                 page_records = response["_embedded"]["records"]
-                records.extend(page_records)
+                yield from page_records
 
                 # Check if there are more pages
                 links = response["_links"]
-                if "next" in links and "href" in links["next"]:
+                if page_records and "next" in links and "href" in links["next"]:
                     # Extract cursor from next URL
                     next_url = links["next"]["href"]
                     if "cursor=" in next_url:
@@ -176,20 +742,18 @@ class StellarDataFetcher:
 
                 page_count += 1
 
-                # Small delay to be nice to the API
-                time.sleep(0.1)
-
         except (ConnectionError, BadRequestError) as e:
             print(f"Error during pagination: {e}")
         except Exception as e:
             print(f"Unexpected error during pagination: {e}")
 
-        return records
-
     def _retry_request(self, func, *args, **kwargs):
         """
         Retry logic for failed requests.
 
+        Every attempt first takes a token from the rate limiter, and 429
+        responses slow the limiter down before the next attempt.
+
         Args:
             func: Function to retry
             *args, **kwargs: Arguments for the function
@@ -198,130 +762,432 @@ class StellarDataFetcher:
             Function result
         """
         for attempt in range(self.MAX_RETRIES):
+            self._bucket.acquire()
             try:
                 return func(*args, **kwargs)
             except (ConnectionError, BadRequestError, Exception) as e:
                 if attempt < self.MAX_RETRIES - 1:
-                    print(
-                        f"Attempt {attempt + 1} failed: {e}. Retrying in {self.RETRY_DELAY}s..."
-                    )
-                    time.sleep(self.RETRY_DELAY * (attempt + 1))
+                    delay = self.RETRY_DELAY * (attempt + 1)
+                    if getattr(e, "status", None) == 429:
+                        response = e.args[0] if e.args else None
+                        delay = self._handle_rate_limited(
+                            getattr(response, "headers", None) or {}, delay
+                        )
+                    print(f"Attempt {attempt + 1} failed: {e}. Retrying in {delay}s...")
+                    time.sleep(delay)
                 else:
                     print(f"All retry attempts failed for {func.__name__}")
                     raise e
 
-    def get_asset_volume(self, asset_code: str, hours: int = 24) -> VolumeData:
+    def _handle_rate_limited(self, headers: Any, default_delay: float) -> float:
         """
-        Get trading volume for a specific asset over the last N hours.
+        React to a 429 response by lowering the request rate to what the
+        server advertises, until its rate-limit window resets.
 
         Args:
-            asset_code: Asset code (e.g., 'XLM', 'USDC')
-            hours: Number of hours to look back
+            headers: Response headers
+            default_delay: Delay to use if the server doesn't advertise one
 
         Returns:
-            VolumeData object with aggregated volume information
+            Seconds to wait before retrying
         """
-        # Generate cache key
-        cache_key = f"volume_{asset_code}_{hours}_{datetime.now().strftime('%Y%m%d%H')}"
+        headers = {str(k).lower(): v for k, v in dict(headers).items()}
 
-        # Check cache
-        if cache_key in self.cache:
-            cached_time, cached_data = self.cache[cache_key]
-            if time.time() - cached_time < self.cache_ttl:
-                print(f"Returning cached data for {asset_code} (last {hours}h)")
-                return cached_data
+        delay = default_delay
+        window = None
+        new_rate = self._bucket.rate / 2
+        try:
+            remaining = int(headers["x-ratelimit-remaining"])
+            reset = float(headers["x-ratelimit-reset"])
+            if reset > 0:
+                # Spread the remaining quota over the rest of the window
+                new_rate = remaining / reset
+                window = reset
+                if remaining == 0:
+                    delay = reset
+        except (KeyError, ValueError):
+            pass
 
-        print(f"Fetching volume data for {asset_code} (last {hours}h)...")
+        try:
+            delay = float(headers["retry-after"])
+            if window is None:
+                window = delay
+        except (KeyError, ValueError):
+            pass
+
+        # The bucket is shared by every fetcher for this Horizon URL, so the
+        # configured rate must come back once the server's window is over
+        self._bucket.set_rate(
+            min(new_rate, self._bucket.rate),
+            window if window is not None else self.RATE_LIMIT_WINDOW,
+        )
+        return delay
+
+    @staticmethod
+    def _l2_key(key: Tuple) -> str:
+        """Build the Redis key for a cache key, e.g. 'volume:XLM:24'."""
+        return ":".join(str(part) for part in key)
+
+    @staticmethod
+    def _serialize(value: Any) -> bytes:
+        """Encode a cache value as JSON bytes."""
+        payload = value.to_dict() if hasattr(value, "to_dict") else value
+        return orjson.dumps(payload, option=orjson.OPT_NAIVE_UTC)
+
+    def _get_or_fetch(
+        self,
+        key: Tuple,
+        loader: Callable[[], Any],
+        decode: Optional[Callable[[Any], Any]] = None,
+    ) -> Any:
+        """
+        Get a value through the cache tiers (see _get_or_fetch_entry).
 
-        end_time = datetime.now()
-        start_time = end_time - timedelta(hours=hours)
+        Returns:
+            Cached or freshly loaded value
+        """
+        return self._get_or_fetch_entry(key, loader, decode)[0]
 
-        # Initialize volume tracking
-        total_volume = 0.0
-        transaction_count = 0
-        volume_by_hour = {f"hour_{i}": 0.0 for i in range(hours)}
+    def _get_or_fetch_entry(
+        self,
+        key: Tuple,
+        loader: Callable[[], Any],
+        decode: Optional[Callable[[Any], Any]] = None,
+        signed: bool = False,
+    ) -> Tuple[Any, bytes]:
+        """
+        Look a value up in the in-process cache (L1), then Redis (L2), and
+        finally fall back to the loader, filling both tiers on the way out.
 
-        try:
-            # For XLM (native asset)
-            if asset_code == "XLM":
-                # Get payments (XLM transactions)
-                payments = self._get_payments_for_period(
-                    start_time, end_time, asset_code="native"
+        L1 entries pair the value with its JSON encoding, which is computed
+        once per load and reused for Redis writes and byte-level reads.
+
+        Concurrent misses for the same key are collapsed: only the first
+        caller loads while the others wait and then read its result. With
+        Redis configured, a short-lived Redis lock extends this across
+        processes.
+
+        Redis errors are logged and treated as misses so a Redis outage
+        never breaks fetching.
+
+        Args:
+            key: Cache key, whose first element is the data type
+            loader: Function fetching the value from Horizon
+            decode: Builds the value from its JSON form (defaults to identity)
+            signed: Call the loader with a Bloom filter to fill with the
+                accounts behind the value, kept as the entry's signature
+
+        Returns:
+            Tuple of (value, JSON-encoded value)
+        """
+        l2_key = self._l2_key(key)
+        entry = self.cache.get(key)
+        if entry is not None:
+            print(f"Returning cached data for {l2_key}")
+            if key[0] in self.REFRESH_AHEAD_TYPES and self._claim_refresh(key):
+                try:
+                    self._executor.submit(self._refresh_entry, key, loader)
+                except RuntimeError:
+                    # Closed fetcher; the entry will simply expire
+                    pass
+            return entry
+
+        with self._inflight_lock(key):
+            # Another caller may have filled the cache while we waited
+            entry = self.cache.get(key)
+            if entry is not None:
+                return entry
+
+            loaded = False
+            signature: Optional[BloomFilter] = None
+
+            def load() -> Any:
+                nonlocal loaded, signature
+                loaded = True
+                if not signed:
+                    return loader()
+                signature = BloomFilter(
+                    self.SIGNATURE_CAPACITY, self.SIGNATURE_ERROR_RATE
                 )
+                return loader(signature)
+
+            entry = self._l2_get(l2_key, decode)
+            if entry is not None:
+                print(f"Returning Redis-cached data for {l2_key}")
+            else:
+                entry = self._load_with_l2_lock(key, l2_key, load, decode)
 
-                for payment in payments:
-                    try:
-                        amount = float(payment.get("amount", "0"))
-                        if amount > 0:
-                            total_volume += amount
-                            transaction_count += 1
-
-                            # Add to hourly bucket
-                            created_at = datetime.fromisoformat(
-                                payment["created_at"].replace("Z", "+00:00")
-                            )
-                            hours_ago = int(
-                                (end_time - created_at).total_seconds() / 3600
-                            )
-                            if 0 <= hours_ago < hours:
-                                volume_by_hour[f"hour_{hours_ago}"] += amount
-
-                    except (KeyError, ValueError) as e:
-                        print(f"Error processing payment: {e}")
-                        continue
+            if signature is not None and signature.saturated:
+                # Too broad to match usefully; rely on the TTL instead
+                signature = None
+            self._store(key, entry, signature, signed=signed and loaded)
 
+        return entry
+
+    def _store(
+        self,
+        key: Tuple,
+        entry: Tuple[Any, bytes],
+        signature: Optional[BloomFilter] = None,
+        signed: bool = False,
+    ) -> None:
+        """
+        Put an entry in L1 together with its account signature, scheduling
+        its refresh-ahead if its type has one.
+
+        The entry and its signature are replaced in one step under
+        _cache_lock, so invalidate_accounts never sees one without the other.
+        With `signed` but no signature, the entry was built here from too
+        many accounts to track and only expires by TTL; without `signed`
+        any previous signature is dropped.
+        """
+        refresh_at = None
+        if key[0] in self.REFRESH_AHEAD_TYPES:
+            ttl = self._ttl_by_type.get(key[0], self.cache_ttl)
+            jitter = random.uniform(
+                1 - self.REFRESH_AHEAD_JITTER, 1 + self.REFRESH_AHEAD_JITTER
+            )
+            refresh_at = time.monotonic() + ttl * self.REFRESH_AHEAD_FRACTION * jitter
+
+        with self._cache_lock:
+            self.cache[key] = entry
+            if signed:
+                self._cache_signatures[key] = signature
             else:
-                # For other assets, we need to look at trades and path payments
-                # This is a simplified approach - in production you'd want more sophisticated logic
-                trades = self._get_trades_for_asset(asset_code, start_time, end_time)
-
-                for trade in trades:
-                    try:
-                        # Check if this is buying or selling our target asset
-                        base_asset = trade.get("base_asset_code")
-                        counter_asset = trade.get("counter_asset_code")
-
-                        if base_asset == asset_code:
-                            amount = float(trade.get("base_amount", "0"))
-                        elif counter_asset == asset_code:
-                            amount = float(trade.get("counter_amount", "0"))
-                        else:
-                            continue
-
-                        if amount > 0:
-                            total_volume += amount
-                            transaction_count += 1
-
-                            # Add to hourly bucket
-                            ledger_close_time = datetime.fromisoformat(
-                                trade["ledger_close_time"].replace("Z", "+00:00")
-                            )
-                            hours_ago = int(
-                                (end_time - ledger_close_time).total_seconds() / 3600
-                            )
-                            if 0 <= hours_ago < hours:
-                                volume_by_hour[f"hour_{hours_ago}"] += amount
-
-                    except (KeyError, ValueError) as e:
-                        print(f"Error processing trade: {e}")
-                        continue
-
-            # Create VolumeData object
-            volume_data = VolumeData(
-                asset_code=asset_code,
-                asset_issuer=None,  # Native XLM has no issuer, for others we'd need issuer info
-                time_period_hours=hours,
-                total_volume=total_volume,
-                transaction_count=transaction_count,
-                start_time=start_time,
-                end_time=end_time,
-                volume_by_hour=volume_by_hour,
+                self._cache_signatures.pop(key, None)
+            if refresh_at is not None:
+                self._refresh_at[key] = refresh_at
+
+    def _claim_refresh(self, key: Tuple) -> bool:
+        """
+        Check whether a cached entry is due for refresh-ahead, claiming the
+        refresh so only one reader schedules it.
+        """
+        with self._cache_lock:
+            refresh_at = self._refresh_at.get(key)
+            if refresh_at is None or time.monotonic() < refresh_at:
+                return False
+            del self._refresh_at[key]
+            return True
+
+    def _refresh_entry(self, key: Tuple, loader: Callable[[], Any]) -> None:
+        """
+        Reload a cache entry from Horizon before it expires.
+
+        Runs on the refresh executor while readers keep getting the current
+        entry. Holding the key's in-flight lock makes readers that miss in
+        the meantime wait for this load instead of starting their own.
+        Errors are logged and the entry is left to expire.
+        """
+        l2_key = self._l2_key(key)
+        try:
+            with self._inflight_lock(key):
+                value = loader()
+                data = self._serialize(value)
+                self._l2_set(key, l2_key, data)
+                self._store(key, (value, data))
+        except Exception as e:
+            print(f"Error refreshing {l2_key}: {e}")
+
+    @contextlib.contextmanager
+    def _inflight_lock(self, key: Tuple) -> Iterator[None]:
+        """Hold the lock serializing loads of a cache key in this process."""
+        with self._inflight_guard:
+            entry = self._inflight.get(key)
+            if entry is None:
+                entry = self._inflight[key] = [threading.Lock(), 0]
+            entry[1] += 1
+
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._inflight_guard:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._inflight[key]
+
+    def _l2_get(
+        self, l2_key: str, decode: Optional[Callable[[Any], Any]] = None
+    ) -> Optional[Tuple[Any, bytes]]:
+        """Read a cache entry from Redis, returning None on miss or error."""
+        if self._l2 is None:
+            return None
+
+        try:
+            raw = self._l2.get(l2_key)
+            if raw is None:
+                return None
+            data = self._decompress(raw)
+            payload = orjson.loads(data)
+            return (decode(payload) if decode else payload), data
+        except Exception as e:
+            print(f"Error reading {l2_key} from Redis: {e}")
+            return None
+
+    def _l2_set(self, key: Tuple, l2_key: str, data: bytes) -> None:
+        """Write encoded data to Redis with its type's TTL, logging any error."""
+        if self._l2 is None:
+            return
+
+        try:
+            ttl = self._ttl_by_type.get(key[0], self.cache_ttl)
+            self._l2.setex(l2_key, ttl, self._compress(data))
+        except Exception as e:
+            print(f"Error writing {l2_key} to Redis: {e}")
+
+    def _compress(self, data: bytes) -> bytes:
+        """
+        Encode JSON bytes for Redis, zstd-compressing large payloads.
+
+        Compressed values carry a one-byte prefix so they can be told apart
+        from plain JSON, which keeps entries written before compression was
+        enabled (or without zstandard installed) readable.
+        """
+        if not ZSTD_AVAILABLE or len(data) < self.L2_COMPRESS_MIN_BYTES:
+            return data
+        compressor = getattr(self._zstd, "compressor", None)
+        if compressor is None:
+            compressor = zstandard.ZstdCompressor(level=self.L2_COMPRESSION_LEVEL)
+            self._zstd.compressor = compressor
+        return self._L2_ZSTD_PREFIX + compressor.compress(data)
+
+    def _decompress(self, raw: bytes) -> bytes:
+        """Decode a Redis value written by _compress back to JSON bytes."""
+        if not raw.startswith(self._L2_ZSTD_PREFIX):
+            return raw
+        if not ZSTD_AVAILABLE:
+            raise ValueError("zstd-compressed entry but zstandard isn't installed")
+        decompressor = getattr(self._zstd, "decompressor", None)
+        if decompressor is None:
+            decompressor = zstandard.ZstdDecompressor()
+            self._zstd.decompressor = decompressor
+        return decompressor.decompress(raw[len(self._L2_ZSTD_PREFIX) :])
+
+    def _load_with_l2_lock(
+        self,
+        key: Tuple,
+        l2_key: str,
+        loader: Callable[[], Any],
+        decode: Optional[Callable[[Any], Any]] = None,
+    ) -> Tuple[Any, bytes]:
+        """
+        Run the loader while holding a Redis lock (SET NX PX) on the key, so
+        only one process fetches it from Horizon at a time.
+
+        Rate-limited loads of many pages can outlast L2_LOCK_TIMEOUT_MS, so
+        the holder keeps renewing the lock until the load finishes; the
+        timeout only bounds how long a crashed holder blocks others.
+        Processes that lose the race poll Redis for the winner's result for
+        as long as the lock is held, and load it themselves if the lock goes
+        away without a result.
+        """
+        if self._l2 is None:
+            value = loader()
+            return value, self._serialize(value)
+
+        lock_key = f"lock:{l2_key}"
+        token = uuid.uuid4().hex
+        acquired = False
+        try:
+            # redis-py returns None when NX finds the lock already held
+            acquired = bool(
+                self._l2.set(lock_key, token, nx=True, px=self.L2_LOCK_TIMEOUT_MS)
             )
+            wait_for_holder = not acquired
+        except Exception as e:
+            print(f"Error acquiring Redis lock for {l2_key}: {e}")
+            wait_for_holder = False
+
+        if wait_for_holder:
+            while True:
+                time.sleep(self.L2_LOCK_POLL_INTERVAL)
+                entry = self._l2_get(l2_key, decode)
+                if entry is not None:
+                    return entry
+                try:
+                    if not self._l2.exists(lock_key):
+                        break
+                except Exception as e:
+                    print(f"Error checking Redis lock for {l2_key}: {e}")
+                    break
+
+        stop_renewing = threading.Event()
+        if acquired:
+            threading.Thread(
+                target=self._renew_l2_lock,
+                args=(lock_key, token, stop_renewing),
+                name=f"stellar-lock-{l2_key}",
+                daemon=True,
+            ).start()
 
-            # Cache the result
-            self.cache[cache_key] = (time.time(), volume_data)
+        try:
+            value = loader()
+            data = self._serialize(value)
+            self._l2_set(key, l2_key, data)
+            return value, data
+        finally:
+            if acquired:
+                stop_renewing.set()
+                try:
+                    self._l2.eval(self._RELEASE_LOCK_SCRIPT, 1, lock_key, token)
+                except Exception as e:
+                    print(f"Error releasing Redis lock for {l2_key}: {e}")
+
+    def _renew_l2_lock(self, lock_key: str, token: str, stop: threading.Event) -> None:
+        """Extend a held Redis lock every third of its lifetime until stopped."""
+        interval = self.L2_LOCK_TIMEOUT_MS / 3000
+        while not stop.wait(interval):
+            try:
+                renewed = self._l2.eval(
+                    self._RENEW_LOCK_SCRIPT,
+                    1,
+                    lock_key,
+                    token,
+                    self.L2_LOCK_TIMEOUT_MS,
+                )
+            except Exception as e:
+                print(f"Error renewing Redis lock {lock_key}: {e}")
+                continue
+            if not renewed:
+                # Expired and possibly taken by another process
+                return
+
+    def del_pattern(self, pattern: str = "volume:*") -> int:
+        """
+        Invalidate Redis cache entries matching a glob pattern.
 
-            return volume_data
+        Uses SCAN rather than KEYS so large keyspaces don't block Redis.
+
+        Args:
+            pattern: Redis glob pattern (default: all volume entries)
+
+        Returns:
+            Number of entries deleted
+        """
+        if self._l2 is None:
+            return 0
+
+        try:
+            keys = list(self._l2.scan_iter(match=pattern, count=500))
+            return self._l2.delete(*keys) if keys else 0
+        except Exception as e:
+            print(f"Error deleting {pattern} from Redis: {e}")
+            return 0
+
+    def get_asset_volume(self, asset_code: str, hours: int = 24) -> VolumeData:
+        """
+        Get trading volume for a specific asset over the last N hours.
+
+        Args:
+            asset_code: Asset code (e.g., 'XLM', 'USDC')
+            hours: Number of hours to look back
+
+        Returns:
+            VolumeData object with aggregated volume information
+        """
+        try:
+            return self._get_volume_entry(asset_code, hours)[0]
 
         except Exception as e:
             print(f"Error fetching volume for {asset_code}: {e}")
@@ -330,146 +1196,278 @@ class StellarDataFetcher:
             traceback.print_exc()
 
             # Return empty volume data on error
-            return VolumeData(
-                asset_code=asset_code,
-                asset_issuer=None,
-                time_period_hours=hours,
-                total_volume=0.0,
-                transaction_count=0,
-                start_time=start_time,
-                end_time=end_time,
-                volume_by_hour={f"hour_{i}": 0.0 for i in range(hours)},
-            )
+            return self._empty_volume_data(asset_code, hours)
 
-    def _get_payments_for_period(
-        self, start_time: datetime, end_time: datetime, asset_code: str = "native"
-    ) -> List[Dict]:
+    def get_asset_volume_bytes(self, asset_code: str, hours: int = 24) -> bytes:
         """
-        Get payments for a specific asset within a time period.
+        Get asset volume as JSON bytes (the to_dict form), ready to send in
+        an HTTP response. Cached volumes are returned without re-encoding.
 
         Args:
-            start_time: Start of time period
-            end_time: End of time period
-            asset_code: Asset code or 'native' for XLM
+            asset_code: Asset code (e.g., 'XLM', 'USDC')
+            hours: Number of hours to look back
 
         Returns:
-            List of payment records
+            JSON-encoded volume data
         """
-        payments = []
-
         try:
-            # Build query
-            payments_call = self.server.payments().order(desc=False).limit(200)
+            return self._get_volume_entry(asset_code, hours)[1]
 
-            # For XLM (native asset)
-            if asset_code == "native":
-                payments_call = payments_call.for_asset(Asset.native())
-            # Note: For other assets, we'd need the issuer as well
+        except Exception as e:
+            print(f"Error fetching volume for {asset_code}: {e}")
+            return self._serialize(self._empty_volume_data(asset_code, hours))
+
+    def _get_volume_entry(
+        self, asset_code: str, hours: int
+    ) -> Tuple[VolumeData, bytes]:
+        """Get the cache entry for an asset's volume, loading it if needed."""
+        return self._get_or_fetch_entry(
+            ("volume", asset_code, hours),
+            lambda accounts: self._fetch_asset_volume(
+                asset_code, hours, accounts=accounts
+            ),
+            decode=VolumeData.from_dict,
+            signed=True,
+        )
 
-            # Get payments with pagination
-            records = self._retry_request(self._handle_pagination, payments_call)
+    @staticmethod
+    def _empty_volume_data(asset_code: str, hours: int) -> VolumeData:
+        """Build the zero-volume result returned when fetching fails."""
+        end_time = datetime.now()
+        return VolumeData(
+            asset_code=asset_code,
+            asset_issuer=None,
+            time_period_hours=hours,
+            total_volume=0.0,
+            transaction_count=0,
+            start_time=end_time - timedelta(hours=hours),
+            end_time=end_time,
+            volume_by_hour={f"hour_{i}": 0.0 for i in range(hours)},
+        )
+
+    def _fetch_asset_volume(
+        self, asset_code: str, hours: int, accounts: Optional[BloomFilter] = None
+    ) -> VolumeData:
+        """
+        Fetch and aggregate volume for an asset from Horizon, bypassing caches.
 
-            # Filter by time
-            for payment in records:
-                try:
-                    created_at = datetime.fromisoformat(
-                        payment["created_at"].replace("Z", "+00:00")
-                    )
-                    if start_time <= created_at <= end_time:
-                        payments.append(payment)
-                    elif created_at > end_time:
-                        # Since we're ordering ascending, we can break early
-                        pass
+        Args:
+            asset_code: Asset code (e.g., 'XLM', 'USDC')
+            hours: Number of hours to look back
+            accounts: Bloom filter collecting the accounts of counted records
 
-                except (KeyError, ValueError) as e:
-                    print(f"Error parsing payment timestamp: {e}")
-                    continue
+        Returns:
+            VolumeData object with aggregated volume information
+        """
+        print(f"Fetching volume data for {asset_code} (last {hours}h)...")
 
-        except Exception as e:
-            print(f"Error getting payments: {e}")
+        end_time = datetime.now()
+        start_time = end_time - timedelta(hours=hours)
 
-        return payments
+        if asset_code == "XLM":
+            # Get payments (XLM transactions)
+            records = self._stream_payments()
+        else:
+            # For other assets, we need to look at trades and path payments
+            # This is a simplified approach - in production you'd want more sophisticated logic
+            records = self._stream_trades()
+
+        total_volume, transaction_count, hourly_volumes = self._aggregate_volumes(
+            records, asset_code, start_time, end_time, hours, accounts=accounts
+        )
+        volume_by_hour = {
+            f"hour_{i}": float(volume) for i, volume in enumerate(hourly_volumes)
+        }
 
-    def _get_trades_for_asset(
-        self, asset_code: str, start_time: datetime, end_time: datetime
-    ) -> List[Dict]:
+        # Create VolumeData object
+        volume_data = VolumeData(
+            asset_code=asset_code,
+            asset_issuer=None,  # Native XLM has no issuer, for others we'd need issuer info
+            time_period_hours=hours,
+            total_volume=total_volume,
+            transaction_count=transaction_count,
+            start_time=start_time,
+            end_time=end_time,
+            volume_by_hour=volume_by_hour,
+        )
+
+        return volume_data
+
+    @staticmethod
+    def _extract_asset_amount(record: Dict, asset_code: str) -> float:
         """
-        Get trades involving a specific asset.
+        Get the amount of an asset moved by a payment or trade record.
 
         Args:
-            asset_code: Asset code to filter by
-            start_time: Start of time period
-            end_time: End of time period
+            record: Payment record (for XLM) or trade record
+            asset_code: Asset code to extract
 
         Returns:
-            List of trade records
+            Amount of the asset, or 0.0 if the record doesn't involve it
+        """
+        if asset_code == "XLM":
+            if record.get("asset_type") != "native":
+                return 0.0
+            return float(record.get("amount", "0"))
+
+        # Check if this is buying or selling our target asset
+        if record.get("base_asset_code") == asset_code:
+            return float(record.get("base_amount", "0"))
+        if record.get("counter_asset_code") == asset_code:
+            return float(record.get("counter_amount", "0"))
+        return 0.0
+
+    def _aggregate_volumes(
+        self,
+        records: Iterable[Dict],
+        asset_code: str,
+        start_time: datetime,
+        end_time: datetime,
+        hours: int,
+        accounts: Optional[BloomFilter] = None,
+    ) -> Tuple[float, int, np.ndarray]:
         """
-        trades = []
+        Aggregate a newest-first record stream into a total and hourly buckets.
 
-        try:
-            # Get trades with pagination
-            trades_call = self.server.trades().order(desc=False).limit(200)
-            records = self._retry_request(self._handle_pagination, trades_call)
+        Window filtering, amount parsing and hourly bucketing are fused into a
+        single pass: each record's timestamp is parsed once, and its amount
+        and bucket index are written into preallocated struct-of-arrays
+        buffers. The stream is abandoned at the first record older than
+        start_time, and the hourly sums are computed with np.bincount.
 
-            # Filter by asset and time
-            for trade in records:
-                try:
-                    base_asset = trade.get("base_asset_code")
-                    counter_asset = trade.get("counter_asset_code")
-                    ledger_close_time = datetime.fromisoformat(
-                        trade["ledger_close_time"].replace("Z", "+00:00")
-                    )
+        Args:
+            records: Payment or trade records, newest first
+            asset_code: Asset code being aggregated
+            start_time: Start of the time period
+            end_time: End of the time period (hour 0 ends here)
+            hours: Number of hourly buckets
+            accounts: Bloom filter collecting the accounts of counted records
 
-                    # Check if trade involves our asset and is within time period
-                    if (
-                        base_asset == asset_code or counter_asset == asset_code
-                    ) and start_time <= ledger_close_time <= end_time:
-                        trades.append(trade)
+        Returns:
+            Tuple of (total volume, transaction count, volume per hour ago)
 
-                except (KeyError, ValueError) as e:
-                    print(f"Error parsing trade: {e}")
+        Raises:
+            ValueError: If hours is not positive
+        """
+        if hours <= 0:
+            raise ValueError(f"hours must be positive, got {hours}")
+
+        capacity = len(records) if isinstance(records, list) else 1024
+        amounts = np.empty(capacity, dtype=np.float64)
+        hours_ago = np.empty(capacity, dtype=np.int64)
+        start_ts = start_time.timestamp()
+        end_ts = end_time.timestamp()
+        count = 0
+        extract_amount = (
+            _extract_asset_amount_compiled
+            if AMOUNT_EXTENSION_AVAILABLE
+            else self._extract_asset_amount
+        )
+
+        for record in records:
+            try:
+                timestamp = record.get("created_at") or record["ledger_close_time"]
+                created_ts = _parse_datetime(timestamp).timestamp()
+                if created_ts < start_ts:
+                    # Records are ordered descending, so the rest are older
+                    break
+                if created_ts > end_ts:
                     continue
+                amount = extract_amount(record, asset_code)
+            except (KeyError, ValueError) as e:
+                print(f"Error processing record: {e}")
+                continue
+
+            if amount > 0:
+                if count == len(amounts):
+                    # Grow geometrically when streaming past the initial guess
+                    amounts = np.resize(amounts, max(2 * count, 1))
+                    hours_ago = np.resize(hours_ago, max(2 * count, 1))
+                amounts[count] = amount
+                hours_ago[count] = min(int((end_ts - created_ts) // 3600), hours - 1)
+                count += 1
+
+                if accounts is not None:
+                    for field in self.ACCOUNT_FIELDS:
+                        if record.get(field):
+                            accounts.add(record[field])
+
+        amounts = amounts[:count]
+        hourly_volumes = np.bincount(
+            hours_ago[:count], weights=amounts, minlength=hours
+        )
+
+        return float(amounts.sum()), count, hourly_volumes
+
+    def _stream_payments(self) -> Iterator[Dict]:
+        """
+        Stream payments across all accounts, newest first.
 
-        except Exception as e:
-            print(f"Error getting trades: {e}")
+        Horizon can't filter payments by asset, so non-native payments are
+        skipped by _extract_asset_amount during aggregation.
+
+        Yields:
+            Payment records
+        """
+        payments_call = self.server.payments().order(desc=True).limit(200)
+        return self._handle_pagination(payments_call)
+
+    def _stream_trades(self) -> Iterator[Dict]:
+        """
+        Stream trades across all order books, newest first.
+
+        Trades that don't involve the aggregated asset are skipped by
+        _extract_asset_amount during aggregation.
 
-        return trades
+        Yields:
+            Trade records
+        """
+        trades_call = self.server.trades().order(desc=True).limit(200)
+        return self._handle_pagination(trades_call)
 
     def get_network_stats(self) -> Dict[str, Any]:
         """
         Get general Stellar network statistics.
 
+        Ledger stats change every few seconds, so they are cached briefly and
+        reloaded in the background shortly before expiring; callers only wait
+        on Horizon for the very first load or after a quiet period.
+
         Returns:
             Dictionary with network metrics
         """
         try:
-            # Get ledger stats
-            ledgers_call = self.server.ledgers().order("desc").limit(1)
-            ledgers = self._retry_request(ledgers_call.call)
-            latest_ledger = (
-                ledgers["_embedded"]["records"][0]
-                if ledgers["_embedded"]["records"]
-                else {}
-            )
-
-            # Get fee stats
-            fee_stats = self._retry_request(self.server.fee_stats)
-
-            return {
-                "latest_ledger": latest_ledger.get("sequence", 0),
-                "ledger_close_time": latest_ledger.get("closed_at", ""),
-                "transaction_count": latest_ledger.get("transaction_count", 0),
-                "operation_count": latest_ledger.get("operation_count", 0),
-                "base_fee": fee_stats.get("last_ledger_base_fee", 0),
-                "fee_pool": fee_stats.get("fee_charged", {}).get("max", 0),
-                "protocol_version": latest_ledger.get("protocol_version", ""),
-                "total_coins": latest_ledger.get("total_coins", "0"),
-            }
+            return self._get_or_fetch(("network_stats",), self._fetch_network_stats)
 
         except Exception as e:
             print(f"Error getting network stats: {e}")
             return {}
 
+    def _fetch_network_stats(self) -> Dict[str, Any]:
+        """Fetch network statistics from Horizon, bypassing caches."""
+        # Get ledger stats
+        ledgers_call = self.server.ledgers().order("desc").limit(1)
+        ledgers = self._retry_request(ledgers_call.call)
+        latest_ledger = (
+            ledgers["_embedded"]["records"][0]
+            if ledgers["_embedded"]["records"]
+            else {}
+        )
+
+        # Get fee stats
+        fee_stats = self._retry_request(self.server.fee_stats().call)
+
+        return {
+            "latest_ledger": latest_ledger.get("sequence", 0),
+            "ledger_close_time": latest_ledger.get("closed_at", ""),
+            "transaction_count": latest_ledger.get("transaction_count", 0),
+            "operation_count": latest_ledger.get("operation_count", 0),
+            "base_fee": fee_stats.get("last_ledger_base_fee", 0),
+            "fee_pool": fee_stats.get("fee_charged", {}).get("max", 0),
+            "protocol_version": latest_ledger.get("protocol_version", ""),
+            "total_coins": latest_ledger.get("total_coins", "0"),
+        }
+
     def get_account_transactions(
         self, account_id: str, limit: int = 100
     ) -> List[TransactionRecord]:
@@ -486,23 +1484,34 @@ class StellarDataFetcher:
         transactions = []
 
         try:
-            # Get transactions for account
-            transactions_call = (
-                self.server.transactions()
+            # Get the account's operations with their parent transactions
+            # embedded, so a single paginated stream covers both
+            operations_call = (
+                self.server.operations()
                 .for_account(account_id)
+                .join("transactions")
                 .order("desc")
-                .limit(min(limit, 200))
+                .limit(200)
             )
-            records = self._retry_request(self._handle_pagination, transactions_call)
 
-            for tx in records[:limit]:
+            # Group operations by transaction; a transaction's operations are
+            # contiguous in the stream
+            operations_by_tx: Dict[str, Tuple[Dict, List[Dict]]] = {}
+            for op in self._handle_pagination(operations_call):
+                tx = op.get("transaction") or {}
+                tx_hash = op.get("transaction_hash") or tx.get("hash", "")
+                if tx_hash not in operations_by_tx:
+                    if len(operations_by_tx) >= limit:
+                        break
+                    operations_by_tx[tx_hash] = (tx, [])
+                operations_by_tx[tx_hash][1].append(op)
+
+            for tx, operations in operations_by_tx.values():
                 try:
                     transaction = TransactionRecord(
                         id=tx.get("id", ""),
                         hash=tx.get("hash", ""),
-                        created_at=datetime.fromisoformat(
-                            tx["created_at"].replace("Z", "+00:00")
-                        ),
+                        created_at=_parse_datetime(tx["created_at"]),
                         source_account=tx.get("source_account", ""),
                         operation_count=int(tx.get("operation_count", 0)),
                         total_amount=float(tx.get("fee_charged", 0))
@@ -524,7 +1533,130 @@ class StellarDataFetcher:
 
     def clear_cache(self):
         """Clear the request cache."""
-        self.cache.clear()
+        with self._cache_lock:
+            self.cache.clear()
+            self._cache_signatures.clear()
+            self._refresh_at.clear()
+
+    def invalidate_accounts(self, accounts: Iterable[str]) -> int:
+        """
+        Drop cached volumes built from records touching any of the accounts.
+
+        Entries are matched through their Bloom filter signatures, so an
+        unrelated entry is occasionally dropped too but a matching one is
+        never kept. Matching entries are removed from Redis as well.
+
+        Volumes read from Redis have no signature here (the process that
+        loaded them holds it and invalidates Redis), so they are dropped from
+        the in-process cache on every call and re-read from Redis. Volumes
+        built from more than SIGNATURE_CAPACITY accounts, such as network-wide
+        XLM volume, aren't tracked and only expire by TTL; signatures can't
+        see new activity from accounts that didn't contribute yet anyway.
+
+        Args:
+            accounts: Account IDs that changed
+
+        Returns:
+            Number of entries invalidated
+        """
+        accounts = list(accounts)
+        invalidated = []
+        matched = []
+
+        with self._cache_lock:
+            for key in self.cache.keys():
+                if key[0] not in self.SIGNATURE_TYPES:
+                    continue
+                if key not in self._cache_signatures:
+                    self.cache.pop(key, None)
+                    invalidated.append(key)
+                    continue
+                signature = self._cache_signatures[key]
+                if signature is not None and any(
+                    account in signature for account in accounts
+                ):
+                    self.cache.pop(key, None)
+                    del self._cache_signatures[key]
+                    invalidated.append(key)
+                    matched.append(key)
+
+            # Forget signatures of entries that expired or were evicted
+            for key in list(self._cache_signatures):
+                if key not in self.cache:
+                    del self._cache_signatures[key]
+
+        if matched and self._l2 is not None:
+            try:
+                self._l2.delete(*(self._l2_key(key) for key in matched))
+            except Exception as e:
+                print(f"Error invalidating Redis entries: {e}")
+
+        return len(invalidated)
+
+    def start_ledger_watcher(self) -> threading.Thread:
+        """
+        Start a background thread that follows Horizon's ledger stream and
+        invalidates cached volumes touched by each newly closed ledger.
+
+        Returns:
+            The watcher thread (already running)
+        """
+        if self._watcher is not None and self._watcher.is_alive():
+            return self._watcher
+
+        self._watcher_stop.clear()
+        self._watcher = threading.Thread(
+            target=self._watch_ledgers, name="stellar-ledger-watcher", daemon=True
+        )
+        self._watcher.start()
+        return self._watcher
+
+    def stop_ledger_watcher(self) -> None:
+        """Ask the ledger watcher to stop after the next ledger event."""
+        self._watcher_stop.set()
+
+    def close(self) -> None:
+        """
+        Release the fetcher's background work and cached data.
+
+        Pending refreshes are cancelled and a refresh already talking to
+        Horizon is waited for, so no worker thread outlives the fetcher.
+        The shared Horizon server and rate limiter stay open for other
+        fetchers.
+        """
+        self.stop_ledger_watcher()
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        self.clear_cache()
+
+    def _watch_ledgers(self) -> None:
+        """Invalidate cache entries for every ledger closed from now on."""
+        try:
+            for ledger in self.server.ledgers().cursor("now").stream():
+                if self._watcher_stop.is_set():
+                    break
+                accounts = self._get_ledger_accounts(ledger["sequence"])
+                if accounts:
+                    self.invalidate_accounts(accounts)
+        except Exception as e:
+            print(f"Ledger watcher stopped: {e}")
+
+    def _get_ledger_accounts(self, sequence: int) -> Set[str]:
+        """
+        Get the accounts touched by the operations of a ledger.
+
+        Args:
+            sequence: Ledger sequence number
+
+        Returns:
+            Set of account IDs
+        """
+        operations_call = self.server.operations().for_ledger(sequence).limit(200)
+        return {
+            op[field]
+            for op in self._handle_pagination(operations_call)
+            for field in self.ACCOUNT_FIELDS
+            if op.get(field)
+        }
 
     def test_connection(self) -> bool:
         """Test connection to Horizon server."""
@@ -553,7 +1685,7 @@ def get_asset_volume(asset_code: str = "XLM", hours: int = 24) -> Dict:
         volume_data = fetcher.get_asset_volume(asset_code, hours)
         return volume_data.to_dict()
     finally:
-        fetcher.clear_cache()
+        fetcher.close()
 
 
 def get_network_overview() -> Dict:
@@ -562,4 +1694,4 @@ def get_network_overview() -> Dict:
     try:
         return fetcher.get_network_stats()
     finally:
-        fetcher.clear_cache()
+        fetcher.close()